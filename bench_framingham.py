@@ -0,0 +1,90 @@
+import argparse
+import time
+
+import numpy as np
+
+from framingham import METHODS, FraminghamRiskScore, cohort_columns, score_batch
+from patient import Patient
+
+
+def synthetic_cohort(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return cohort_columns(
+        {
+            "gender": rng.integers(0, 2, n),
+            "age": rng.integers(30, 90, n),
+            "hdl": np.round(rng.uniform(0.5, 2.5, n), 2),
+            "total_cholesterol": np.round(rng.uniform(2.5, 9.0, n), 2),
+            "systolic_bp": rng.integers(90, 200, n),
+            "hbp_treatment": rng.integers(0, 2, n),
+            "smoker": rng.integers(0, 2, n),
+        }
+    )
+
+
+def best_of(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def bench_scalar(columns, n):
+    patients = [
+        Patient(
+            gender="Male" if columns["male"][i] else "Female",
+            age=int(columns["age"][i]),
+            hdl=float(columns["hdl"][i]),
+            total_cholesterol=float(columns["total_cholesterol"][i]),
+            systolic_bp=int(columns["systolic_bp"][i]),
+            hbp_treatment=bool(columns["hbp_treatment"][i]),
+            smoker=bool(columns["smoker"][i]),
+        )
+        for i in range(n)
+    ]
+
+    def run():
+        for pt in patients:
+            FraminghamRiskScore(pt).calc_frs()
+
+    return run
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark Framingham batch scoring.")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--scalar-rows", type=int, default=20_000)
+    args = parser.parse_args()
+
+    columns = synthetic_cohort(args.rows)
+    print(f"Cohort size: {args.rows} rows, best of {args.repeat}")
+    print("--")
+
+    timings = {}
+    for factor_points in (True, False):
+        for method in METHODS:
+            timing = best_of(
+                lambda: score_batch(columns, method=method, factor_points=factor_points),
+                args.repeat,
+            )
+            timings[method, factor_points] = timing
+            print(
+                f"score_batch({method!r}, factor_points={factor_points!s:5}): {timing * 1e3:8.1f} ms "
+                f"({args.rows / timing / 1e6:6.1f} M rows/s)"
+            )
+
+    scalar = best_of(bench_scalar(columns, args.scalar_rows), 1)
+    print(
+        f"FraminghamRiskScore loop: {scalar / args.scalar_rows * args.rows * 1e3:8.1f} ms "
+        f"({args.scalar_rows / scalar / 1e6:6.1f} M rows/s, extrapolated)"
+    )
+    print("--")
+    # Defaults: factor points for "points", none for "equation"
+    print(
+        "equation / points: "
+        f"{timings['equation', False] / timings['points', True]:.2f}x with score_batch defaults, "
+        f"{timings['equation', True] / timings['points', True]:.2f}x with factor points for both"
+    )
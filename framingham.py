@@ -17,6 +17,8 @@ class FraminghamRiskScore:
         self.ten_yr_risk_percent = 0.0
         self.heart_age = 0
         self.risk_level = ""
+        # Per-factor points, filled in by calc_frs()
+        self.factor_points = {}
         #   Statin-indicated conditions NOT implemented. Too complicated, not really a way to model it.
         self.statin_condition = False
 
@@ -274,11 +276,13 @@ class FraminghamRiskScore:
         return self.ten_yr_risk_percent, self.heart_age, self.risk_level
 
     def calc_frs(self):
-        self.calc_pts_age()
-        self.calc_pts_bp()
-        self.calc_pts_hdl()
-        self.calc_pts_total_cholesterol()
-        self.calc_pts_smoker()
+        self.factor_points = {
+            "age": self.calc_pts_age(),
+            "bp": self.calc_pts_bp(),
+            "hdl": self.calc_pts_hdl(),
+            "total_cholesterol": self.calc_pts_total_cholesterol(),
+            "smoker": self.calc_pts_smoker(),
+        }
         self.interpret_score()
 
         if self.verbose:
@@ -292,8 +296,454 @@ def mgdL_to_mmolL(cholesterol_val):
     return cholesterol_val * 0.0259
 
 
+def mmolL_to_mgdL(cholesterol_val):
+    return cholesterol_val / 0.0259
+
+
+#   Batch scoring
+#   Score a whole cohort at once with NumPy instead of one FraminghamRiskScore per patient.
+
+METHODS = ("points", "equation")
+RISK_LEVELS = ("Low", "Intermediate", "High")
+
+# Points tables as (lower bin edges, male_points, female_points), mirroring the
+# ranges in the FraminghamRiskScore.calc_pts_* methods.
+_AGE_POINTS = (
+    [0, 35, 40, 45, 50, 55, 60, 65, 70, 75],
+    [0, 2, 5, 7, 8, 10, 11, 12, 14, 15],
+    [0, 2, 4, 5, 7, 8, 9, 10, 11, 12],
+)
+_HDL_POINTS = (
+    [0.0, 0.9, 1.2, 1.3, 1.6],
+    [2, 1, 0, -1, -2],
+    [2, 1, 0, -1, -2],
+)
+_CHOL_POINTS = (
+    [0.0, 4.1, 5.2, 6.2, 7.21],
+    [0, 1, 2, 3, 4],
+    [0, 1, 3, 4, 5],
+)
+_BP_UNTREATED_POINTS = (
+    [0, 120, 130, 140, 150, 160],
+    [-2, 0, 1, 2, 2, 3],
+    [-3, 0, 1, 2, 4, 5],
+)
+_BP_TREATED_POINTS = (
+    [0, 120, 130, 140, 150, 160],
+    [0, 2, 3, 4, 4, 5],
+    [-1, 2, 3, 5, 6, 7],
+)
+_SMOKER_POINTS = (4, 3)
+
+# Scores outside this range are saturated by interpret_score(), so the lookup
+# tables only need to cover it.
+_MIN_SCORE, _MAX_SCORE = -5, 33
+
+# Sex-specific Cox model coefficients for 10-year general CVD risk
+# (D'Agostino et al., Circulation 2008). Cholesterol is in mg/dL.
+# Diabetes is not modelled, same as the points table.
+_EQUATION_COEFFS = {
+    "Male": {
+        "ln_age": 3.06117,
+        "ln_total_cholesterol": 1.12370,
+        "ln_hdl": -0.93263,
+        "ln_sbp_untreated": 1.93303,
+        "ln_sbp_treated": 1.99881,
+        "smoker": 0.65451,
+        "mean": 23.9802,
+        "baseline_survival": 0.88936,
+    },
+    "Female": {
+        "ln_age": 2.32888,
+        "ln_total_cholesterol": 1.20904,
+        "ln_hdl": -0.70833,
+        "ln_sbp_untreated": 2.76157,
+        "ln_sbp_treated": 2.82263,
+        "smoker": 0.52873,
+        "mean": 26.1931,
+        "baseline_survival": 0.95012,
+    },
+}
+# Risk factors of the "normal" reference person used for heart age.
+_OPTIMAL_TOTAL_CHOLESTEROL = 180.0
+_OPTIMAL_HDL = 45.0
+_OPTIMAL_SBP = 125.0
+# Maps a rounded heart age clipped to [29, 81] to the reported value
+_HEART_AGE_CLAMP = np.array([0] + list(range(30, 81)) + [100], dtype=np.int16)
+
+_score_lookup = None
+
+
+def cohort_columns(cohort, method="points"):
+    """
+    Normalize a cohort to a dict of NumPy arrays, applying the same checks as
+    Patient to every row (see validate_columns()).
+
+    Args:
+        cohort: Either a sequence of Patient objects, or a mapping / DataFrame with
+            columns gender, age, hdl, total_cholesterol (mmol/L), systolic_bp and
+            optionally hbp_treatment and smoker. gender may be "Male"/"Female" or
+            numeric with 1 = Male.
+        method: Scoring method the columns are for, as in score_batch().
+
+    Returns:
+        Dict with boolean arrays male, hbp_treatment, smoker and float arrays
+        age, hdl, total_cholesterol, systolic_bp.
+    """
+    if isinstance(cohort, (list, tuple)) and (not cohort or isinstance(cohort[0], Patient)):
+        cohort = {
+            "gender": [pt.gender for pt in cohort],
+            "age": [pt.age for pt in cohort],
+            "hdl": [pt.hdl for pt in cohort],
+            "total_cholesterol": [pt.total_cholesterol for pt in cohort],
+            "systolic_bp": [pt.systolic_bp for pt in cohort],
+            "hbp_treatment": [pt.hbp_treatment for pt in cohort],
+            "smoker": [pt.smoker for pt in cohort],
+        }
+
+    gender = np.asarray(cohort["gender"])
+    if gender.dtype.kind in "biuf":
+        invalid = ~np.isfinite(gender) if gender.dtype.kind == "f" else np.zeros(len(gender), dtype=bool)
+        if invalid.any():
+            raise ValueError(
+                f"Invalid gender provided: {gender[invalid][0]} Must be 'Male' or 'Female'."
+            )
+        male = gender.astype(bool)
+    else:
+        invalid = ~np.isin(gender, ["Male", "Female"])
+        if invalid.any():
+            raise ValueError(
+                f"Invalid gender provided: {gender[invalid][0]} Must be 'Male' or 'Female'."
+            )
+        male = gender == "Male"
+
+    n = len(male)
+    columns = {"male": male}
+    for name in ("age", "hdl", "total_cholesterol", "systolic_bp"):
+        columns[name] = np.asarray(cohort[name], dtype=np.float64)
+    for name in ("hbp_treatment", "smoker"):
+        if name in cohort:
+            columns[name] = np.asarray(cohort[name]).astype(bool)
+        else:
+            columns[name] = np.zeros(n, dtype=bool)
+    validate_columns(columns, method)
+    return columns
+
+
+def validate_columns(columns, method="points"):
+    """
+    Apply Patient's input checks to whole columns, with the same error messages.
+    Missing (NaN) and infinite values are rejected too, since the points tables
+    would otherwise silently bin them. The equation method takes logs, so it
+    also needs strictly positive cholesterol levels.
+    """
+    # Checked through min / max only: a NaN makes both reductions NaN, and every
+    # comparison with NaN is False, so one bad row fails the whole check.
+    def in_range(values, low, high=np.inf, low_inclusive=True):
+        if not len(values):
+            return True
+        smallest, largest = values.min(), values.max()
+        above = smallest >= low if low_inclusive else smallest > low
+        return bool(above and largest <= high and np.isfinite(largest))
+
+    if not in_range(columns["age"], 1, 999, low_inclusive=False):
+        raise ValueError("Patient must be at least 30 years old.")
+    # The equation takes log(hdl) and log(total_cholesterol)
+    positive = method == "equation"
+    if not in_range(columns["hdl"], 0, low_inclusive=not positive):
+        raise ValueError("Please enter a valid HDL-C level.")
+    if not in_range(columns["total_cholesterol"], 0, low_inclusive=not positive):
+        raise ValueError("Please enter a valid total cholesterol level.")
+    if not in_range(columns["systolic_bp"], 60):
+        raise ValueError("Please enter a valid systolic blood pressure.")
+
+
+def _lookup_points(values, table, row):
+    """
+    Vectorized points-table lookup.
+
+    Args:
+        values: Risk factor values.
+        table: Tuple of (lower bin edges, male_points, female_points, ...).
+        row: Index of the points row to use for each value; 0 = male, 1 = female.
+    """
+    edges, points = table[0], np.asarray(table[1:], dtype=np.int8).ravel()
+    # Bin index = number of upper edges at or below the value; values below the
+    # first edge (negative readings) fall into the lowest bin. For these short
+    # tables this is much faster than np.searchsorted.
+    idx = np.asarray(row, dtype=np.intp) * len(edges)
+    for edge in edges[1:]:
+        idx += values >= edge
+    return points.take(idx)
+
+
+def _get_score_lookup():
+    """
+    Build (male, female) lookup arrays over the score range for ten-year risk and
+    heart age, by running FraminghamRiskScore.interpret_score() once per score.
+    """
+    global _score_lookup
+    if _score_lookup is None:
+        scores = range(_MIN_SCORE, _MAX_SCORE + 1)
+        risk = np.empty((2, len(scores)), dtype=np.float64)
+        heart_age = np.empty((2, len(scores)), dtype=np.int16)
+        for row, gender in enumerate(("Male", "Female")):
+            reference = FraminghamRiskScore(
+                Patient(gender=gender, age=30, hdl=1.2, total_cholesterol=4.0, systolic_bp=120)
+            )
+            for col, score in enumerate(scores):
+                reference.score = score
+                risk[row, col], heart_age[row, col], _ = reference.interpret_score()
+        _score_lookup = (risk, heart_age)
+    return _score_lookup
+
+
+def _risk_level_codes(ten_yr_risk_percent):
+    # Same thresholds as interpret_score(); codes index into RISK_LEVELS
+    return (
+        (ten_yr_risk_percent >= 10.0).astype(np.uint8)
+        + (ten_yr_risk_percent >= 20.0).astype(np.uint8)
+    )
+
+
+def _score_points(columns, sex):
+    bp_table = _BP_UNTREATED_POINTS + _BP_TREATED_POINTS[1:]
+    points = {
+        "age_pts": _lookup_points(columns["age"], _AGE_POINTS, sex),
+        "hdl_pts": _lookup_points(columns["hdl"], _HDL_POINTS, sex),
+        "total_cholesterol_pts": _lookup_points(columns["total_cholesterol"], _CHOL_POINTS, sex),
+        # Rows 0-1 untreated (male, female), rows 2-3 treated
+        "bp_pts": _lookup_points(columns["systolic_bp"], bp_table, sex + 2 * columns["hbp_treatment"]),
+        "smoker_pts": np.asarray(_SMOKER_POINTS, dtype=np.int8).take(sex) * columns["smoker"].view(np.int8),
+    }
+    points["score"] = (
+        points["age_pts"].astype(np.int16)
+        + points["hdl_pts"]
+        + points["total_cholesterol_pts"]
+        + points["bp_pts"]
+        + points["smoker_pts"]
+    )
+    return points
+
+
+def _coeff_array(name):
+    return np.array([_EQUATION_COEFFS["Male"][name], _EQUATION_COEFFS["Female"][name]])
+
+
+def _score_equation(columns, sex):
+    """
+    Continuous ten-year risk and heart age from the sex-specific Cox model.
+
+    Per-sex constants are folded into one offset so the per-row work is a few
+    logs, multiply-adds and exps.
+
+    Returns:
+        Tuple: (ten_yr_risk_percent, heart_age)
+    """
+    beta_age = _coeff_array("ln_age")
+    beta_chol = _coeff_array("ln_total_cholesterol")
+    beta_hdl = _coeff_array("ln_hdl")
+    beta_sbp_untreated = _coeff_array("ln_sbp_untreated")
+    # Rows 0-1 untreated (male, female), rows 2-3 treated
+    beta_sbp = np.concatenate([beta_sbp_untreated, _coeff_array("ln_sbp_treated")])
+    # Inputs are in mmol/L, the model wants mg/dL: ln(x / 0.0259) = ln(x) - ln(0.0259)
+    offset = (beta_chol + beta_hdl) * np.log(mmolL_to_mgdL(1.0)) - _coeff_array("mean")
+
+    # linear = sum(beta * x) - mean
+    linear = beta_age.take(sex) * np.log(columns["age"])
+    linear += beta_chol.take(sex) * np.log(columns["total_cholesterol"])
+    linear += beta_hdl.take(sex) * np.log(columns["hdl"])
+    linear += beta_sbp.take(sex + 2 * columns["hbp_treatment"]) * np.log(columns["systolic_bp"])
+    linear += _coeff_array("smoker").take(sex) * columns["smoker"]
+    linear += offset.take(sex)
+
+    # 1 - S0 ** exp(linear), with the power written as exp(log(S0) * ...)
+    log_survival = np.log(_coeff_array("baseline_survival"))
+    ten_yr_risk = np.exp(linear)
+    ten_yr_risk *= log_survival.take(sex)
+    ten_yr_risk = np.expm1(ten_yr_risk, out=ten_yr_risk)
+    ten_yr_risk *= -100.0
+
+    # Heart age: the age at which someone with optimal risk factors has the same risk
+    optimal_factors = (
+        beta_chol * np.log(_OPTIMAL_TOTAL_CHOLESTEROL)
+        + beta_hdl * np.log(_OPTIMAL_HDL)
+        + beta_sbp_untreated * np.log(_OPTIMAL_SBP)
+    )
+    linear += (_coeff_array("mean") - optimal_factors).take(sex)
+    linear /= beta_age.take(sex)
+    heart_age = np.exp(linear, out=linear)
+    np.clip(heart_age, 29, 81, out=heart_age)
+    # Same convention as interpret_score(): 0 means < 30, 100 means > 80
+    return ten_yr_risk, _HEART_AGE_CLAMP.take(np.rint(heart_age).astype(np.intp) - 29)
+
+
+def score_batch(cohort, method="points", factor_points=None):
+    """
+    Score a whole cohort in one vectorized pass.
+
+    Args:
+        cohort: Sequence of Patient objects, or columns accepted by cohort_columns().
+        method: "points" for the points-table approximation (same results as
+            FraminghamRiskScore), or "equation" for the continuous Cox model.
+            Decides how ten-year risk and heart age are derived.
+        factor_points: Whether to also report the per-factor points and total
+            points score. Defaults to True for "points" and False for "equation",
+            so the equation method skips the points table and runs at points-table
+            speed. Pass True to get the points breakdown alongside the equation.
+
+    Returns:
+        Dict of NumPy arrays: heart_age, ten_yr_risk_percent and risk_level
+        (uint8 codes into RISK_LEVELS), plus age_pts, hdl_pts,
+        total_cholesterol_pts, bp_pts, smoker_pts and score if factor_points.
+    """
+    if method not in METHODS:
+        raise ValueError(f"Invalid method provided: {method} Must be one of {METHODS}.")
+    if factor_points is None:
+        factor_points = method == "points"
+    if "male" in cohort:
+        columns = cohort
+        validate_columns(columns, method)
+    else:
+        columns = cohort_columns(cohort, method)
+
+    # 0 = male, 1 = female; indexes the sex-specific tables
+    sex = (~columns["male"]).view(np.int8).astype(np.intp)
+    results = {}
+    if method == "points" or factor_points:
+        results = _score_points(columns, sex)
+    if method == "points":
+        risk, heart_age = _get_score_lookup()
+        idx = np.clip(results["score"], _MIN_SCORE, _MAX_SCORE) - _MIN_SCORE
+        idx += sex * risk.shape[1]
+        ten_yr_risk, heart_age = risk.ravel().take(idx), heart_age.ravel().take(idx)
+    else:
+        ten_yr_risk, heart_age = _score_equation(columns, sex)
+    if factor_points:
+        results["score"] = results["score"].astype(np.int8)
+    else:
+        results = {}
+    results["heart_age"] = heart_age
+    results["ten_yr_risk_percent"] = ten_yr_risk
+    results["risk_level"] = _risk_level_codes(results["ten_yr_risk_percent"])
+    return results
+
+
+def score_stream(chunks, method="points", factor_points=None, sinks=()):
+    """
+    Score a cohort chunk by chunk, so it never has to be in memory all at once.
+
+    This is a generator: nothing is scored, and no sink is fed, until the stream
+    is consumed. Use score_to_sinks() when only the sinks are of interest.
+
+    Args:
+        chunks: Iterable of cohort chunks, each accepted by score_batch().
+        method, factor_points: As in score_batch().
+        sinks: Objects with an update(columns, results) method, e.g.
+            frs_stats.CohortAggregator or frs_results.ResultWriter. Each one
+            is fed every chunk as the stream reaches it.
+
+    Yields:
+        Tuple: (columns, results) per chunk, where columns is the output of
+        cohort_columns() and results the output of score_batch().
+    """
+    for chunk in chunks:
+        columns = chunk if "male" in chunk else cohort_columns(chunk, method)
+        results = score_batch(columns, method=method, factor_points=factor_points)
+        for sink in sinks:
+            sink.update(columns, results)
+        yield columns, results
+
+
+def score_to_sinks(chunks, sinks, method="points", factor_points=None):
+    """
+    Drain score_stream() into the sinks without keeping any results.
+
+    Returns:
+        Number of rows scored.
+    """
+    n_rows = 0
+    for columns, _ in score_stream(chunks, method, factor_points, sinks):
+        n_rows += len(columns["male"])
+    return n_rows
+
+
 if __name__ == "__main__":
 
+    # Batch scoring: points method must agree with FraminghamRiskScore
+    rng = np.random.default_rng(0)
+    cohort = [
+        Patient(
+            gender=str(rng.choice(["Male", "Female"])),
+            age=int(rng.integers(30, 90)),
+            hdl=round(float(rng.uniform(0.5, 2.5)), 2),
+            total_cholesterol=round(float(rng.uniform(2.5, 9.0)), 2),
+            systolic_bp=int(rng.integers(90, 200)),
+            hbp_treatment=bool(rng.integers(0, 2)),
+            smoker=bool(rng.integers(0, 2)),
+        )
+        for _ in range(2000)
+    ]
+    batch = score_batch(cohort)
+    for i, pt in enumerate(cohort):
+        frs_test = FraminghamRiskScore(pt)
+        assert batch["score"][i] == frs_test.calc_frs()
+        assert batch["age_pts"][i] == frs_test.factor_points["age"]
+        assert batch["bp_pts"][i] == frs_test.factor_points["bp"]
+        assert (
+            batch["ten_yr_risk_percent"][i],
+            batch["heart_age"][i],
+            RISK_LEVELS[batch["risk_level"][i]],
+        ) == (frs_test.ten_yr_risk_percent, frs_test.heart_age, frs_test.risk_level)
+
+    # Equation method is continuous across the HDL 1.19 / 1.2 bin boundary
+    columns = cohort_columns(
+        {
+            "gender": ["Male", "Male"],
+            "age": [55, 55],
+            "hdl": [1.19, 1.2],
+            "total_cholesterol": [5.5, 5.5],
+            "systolic_bp": [135, 135],
+        }
+    )
+    points_risk = score_batch(columns, method="points")["ten_yr_risk_percent"]
+    equation_risk = score_batch(columns, method="equation")["ten_yr_risk_percent"]
+    assert points_risk[0] - points_risk[1] > 1.0
+    assert 0.0 < equation_risk[0] - equation_risk[1] < 0.2
+    # The equation method only builds the points table when asked to
+    assert "score" not in score_batch(columns, method="equation")
+    assert np.array_equal(
+        score_batch(columns, method="equation", factor_points=True)["score"],
+        score_batch(columns, method="points")["score"],
+    )
+
+    # Rows Patient would reject are rejected by the batch path too, not scored
+    for name, bad, method in [
+        ("hdl", np.nan, "points"),
+        ("hdl", np.nan, "equation"),
+        ("hdl", 0.0, "equation"),
+        ("total_cholesterol", -1.0, "points"),
+        ("age", np.inf, "points"),
+        ("systolic_bp", 50, "equation"),
+    ]:
+        invalid = {
+            "gender": ["Male", "Female"],
+            "age": [55, 60],
+            "hdl": [1.2, 1.3],
+            "total_cholesterol": [5.5, 5.0],
+            "systolic_bp": [135, 120],
+        }
+        invalid[name] = [invalid[name][0], bad]
+        try:
+            score_batch(invalid, method=method)
+            raise AssertionError(f"{name}={bad} was scored with method {method}")
+        except ValueError:
+            pass
+    # HDL of 0 is a valid Patient reading, so the points method still scores it
+    assert score_batch({**invalid, "hdl": [0.0, 1.0], "systolic_bp": [135, 120]})["hdl_pts"][0] == 2
+    print("All batch checks passed!")
+    print("")
+
     #   Case 1: Low-Risk Male
     pt = Patient(
         name="John Doe",
@@ -0,0 +1,470 @@
+import json
+import mmap
+import os
+import struct
+import zlib
+
+import numpy as np
+import pandas as pd
+
+from framingham import RISK_LEVELS
+
+# File layout:
+#   MAGIC | compressed column blocks, chunk by chunk | JSON footer | footer length (uint64) | MAGIC
+# The footer indexes every (chunk, column) block by (offset, length) so a reader
+# only has to touch the tail of the file to open it.
+MAGIC = b"FRSRES01"
+FORMAT_VERSION = 1
+DEFAULT_CHUNK_ROWS = 1 << 16
+
+# (column name, on-disk dtype). Points, score and heart age are small integers.
+COLUMNS = (
+    ("age_pts", "<i1"),
+    ("hdl_pts", "<i1"),
+    ("total_cholesterol_pts", "<i1"),
+    ("bp_pts", "<i1"),
+    ("smoker_pts", "<i1"),
+    ("score", "<i1"),
+    ("heart_age", "<i2"),
+    ("ten_yr_risk_percent", "<f4"),
+    ("risk_level", "u1"),
+)
+COLUMN_NAMES = tuple(name for name, _ in COLUMNS)
+# Optional as a group: score_batch() leaves them out unless factor_points is set
+POINTS_COLUMN_NAMES = COLUMN_NAMES[:6]
+
+# Risk level is stored as a categorical code, an index into RISK_LEVELS.
+_RISK_CODES = {level: code for code, level in enumerate(RISK_LEVELS)}
+
+_TRAILER = struct.Struct("<Q")
+
+
+def encode_risk_levels(levels):
+    """
+    Convert risk level strings ("Low", "Intermediate", "High") to uint8 codes.
+    Integer input is taken as codes, and must be valid indices into RISK_LEVELS.
+    """
+    levels = np.asarray(levels)
+    if levels.dtype.kind in "iu":
+        invalid = (levels < 0) | (levels >= len(RISK_LEVELS))
+        if invalid.any():
+            raise ValueError(
+                f"Invalid risk level: {levels[invalid][0]} Must be a code below {len(RISK_LEVELS)}."
+            )
+        return levels.astype("u1")
+    try:
+        return np.array([_RISK_CODES[level] for level in levels.tolist()], dtype="u1")
+    except KeyError as error:
+        raise ValueError(
+            f"Invalid risk level: {error.args[0]} Must be one of {RISK_LEVELS}."
+        ) from None
+
+
+def decode_risk_levels(codes):
+    """
+    Convert uint8 risk level codes back to a pandas Categorical.
+    """
+    return pd.Categorical.from_codes(np.asarray(codes, dtype=np.int8), RISK_LEVELS)
+
+
+def _to_column(name, values, dtype):
+    """
+    Cast values to a column's on-disk dtype, refusing values the narrow integer
+    types cannot hold instead of letting them wrap around.
+    """
+    values = np.asarray(values)
+    dtype = np.dtype(dtype)
+    if dtype.kind == "i" and values.size:
+        limits = np.iinfo(dtype)
+        if values.dtype.kind == "f" and not np.isfinite(values).all():
+            raise ValueError(f"Result column {name} has non-finite values.")
+        low, high = values.min(), values.max()
+        if low < limits.min or high > limits.max:
+            bad = low if low < limits.min else high
+            raise ValueError(
+                f"Result column {name} has value {bad} outside the {dtype.name} range "
+                f"[{limits.min}, {limits.max}]."
+            )
+    return values.astype(dtype, copy=False)
+
+
+class ResultWriter:
+    """
+    Streams scored cohort results into the compact columnar format.
+
+    Rows are buffered until a full chunk is available, then every column of the
+    chunk is compressed independently. The footer index is written by close();
+    used as a context manager, the file is removed instead if the block raises.
+    """
+
+    def __init__(self, path, chunk_rows=DEFAULT_CHUNK_ROWS, compress_level=6):
+        if chunk_rows <= 0:
+            raise ValueError("chunk_rows must be a positive integer.")
+        self.path = path
+        self.chunk_rows = chunk_rows
+        self.compress_level = compress_level
+        self.n_rows = 0
+
+        self._file = open(path, "wb")
+        self._file.write(MAGIC)
+        self._offset = len(MAGIC)
+        self._chunks = []
+        # Set by the first append: COLUMNS, or COLUMNS without the points columns
+        self._columns = None
+        self._pending = {}
+        self._pending_rows = 0
+        self._row_buffer = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def append(self, columns):
+        """
+        Append a block of rows.
+
+        Args:
+            columns: Mapping of column name to array-like, one entry per name in
+                COLUMN_NAMES, all of the same length. The POINTS_COLUMN_NAMES may
+                be left out together, e.g. for equation results scored without
+                factor points, but every append to a file must agree. risk_level
+                may hold either level strings or codes.
+        """
+        self._flush_rows()
+        self._append_columns(columns)
+
+    def update(self, columns, results):
+        """
+        Sink interface for framingham.score_stream(): appends the scored results.
+        """
+        self.append(results)
+
+    def append_frs(self, pt_frs):
+        """
+        Append a single scored FraminghamRiskScore (calc_frs() must have been called).
+        """
+        points = pt_frs.factor_points
+        if not points:
+            raise ValueError("calc_frs() must be called before writing a result.")
+        self._row_buffer.append(
+            (
+                points["age"],
+                points["hdl"],
+                points["total_cholesterol"],
+                points["bp"],
+                points["smoker"],
+                pt_frs.score,
+                pt_frs.heart_age,
+                pt_frs.ten_yr_risk_percent,
+                _RISK_CODES[pt_frs.risk_level],
+            )
+        )
+        if len(self._row_buffer) >= self.chunk_rows:
+            self._flush_rows()
+
+    def close(self):
+        if self._file is None:
+            return
+        self._flush_rows()
+        if self._columns is None:
+            self._columns = COLUMNS
+        if self._pending_rows:
+            self._write_chunk(
+                {name: np.concatenate(self._pending[name]) for name, _ in self._columns}
+            )
+        footer = json.dumps(
+            {
+                "version": FORMAT_VERSION,
+                "n_rows": self.n_rows,
+                "chunk_rows": self.chunk_rows,
+                "columns": [[name, dtype] for name, dtype in self._columns],
+                "risk_levels": list(RISK_LEVELS),
+                "chunks": self._chunks,
+            },
+            separators=(",", ":"),
+        ).encode("utf-8")
+        self._file.write(footer)
+        self._file.write(_TRAILER.pack(len(footer)))
+        self._file.write(MAGIC)
+        self._file.close()
+        self._file = None
+
+    def abort(self):
+        """
+        Discard a partially written file. No footer is written, so an aborted
+        write can never be mistaken for a complete result set.
+        """
+        if self._file is None:
+            return
+        self._file.close()
+        self._file = None
+        os.remove(self.path)
+
+    def _flush_rows(self):
+        if not self._row_buffer:
+            return
+        rows = list(zip(*self._row_buffer))
+        self._row_buffer = []
+        self._append_columns(dict(zip(COLUMN_NAMES, rows)))
+
+    def _append_columns(self, columns):
+        if any(name in columns for name in POINTS_COLUMN_NAMES):
+            expected = COLUMNS
+        else:
+            expected = tuple(column for column in COLUMNS if column[0] not in POINTS_COLUMN_NAMES)
+        missing = {name for name, _ in expected} - set(columns)
+        if missing:
+            raise ValueError(f"Missing result columns: {sorted(missing)}")
+        if self._columns is None:
+            self._columns = expected
+            self._pending = {name: [] for name, _ in expected}
+        elif expected != self._columns:
+            raise ValueError("Every append must have the same result columns, with or without factor points.")
+
+        arrays = {}
+        for name, dtype in self._columns:
+            if name == "risk_level":
+                arrays[name] = encode_risk_levels(columns[name])
+            else:
+                arrays[name] = _to_column(name, columns[name], dtype)
+        lengths = {len(array) for array in arrays.values()}
+        if len(lengths) != 1:
+            raise ValueError("All result columns must have the same length.")
+        n = lengths.pop()
+
+        start = 0
+        while start < n:
+            take = min(self.chunk_rows - self._pending_rows, n - start)
+            for name in arrays:
+                self._pending[name].append(arrays[name][start:start + take])
+            self._pending_rows += take
+            start += take
+            if self._pending_rows == self.chunk_rows:
+                self._write_chunk(
+                    {name: np.concatenate(self._pending[name]) for name in arrays}
+                )
+
+    def _write_chunk(self, arrays):
+        n = len(arrays["risk_level"])
+        index = {}
+        for name in arrays:
+            block = zlib.compress(arrays[name].tobytes(), self.compress_level)
+            self._file.write(block)
+            index[name] = [self._offset, len(block)]
+            self._offset += len(block)
+        self._chunks.append({"n_rows": n, "columns": index})
+        self.n_rows += n
+        self._pending = {name: [] for name in arrays}
+        self._pending_rows = 0
+
+
+class ResultReader:
+    """
+    Memory-mapped reader for the compact columnar format.
+
+    Opening only parses the footer; column blocks are decompressed on demand,
+    and only for the chunks that overlap the requested rows.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        trailer_size = _TRAILER.size + len(MAGIC)
+        if (
+            len(self._mmap) < len(MAGIC) + trailer_size
+            or self._mmap[: len(MAGIC)] != MAGIC
+            or self._mmap[-len(MAGIC):] != MAGIC
+        ):
+            self.close()
+            raise ValueError(f"Not a scored result file: {path}")
+        (footer_len,) = _TRAILER.unpack_from(self._mmap, len(self._mmap) - trailer_size)
+        footer_start = len(self._mmap) - trailer_size - footer_len
+        footer = json.loads(self._mmap[footer_start:footer_start + footer_len])
+        if footer["version"] != FORMAT_VERSION:
+            self.close()
+            raise ValueError(f"Unsupported result file version: {footer['version']}")
+
+        self.n_rows = footer["n_rows"]
+        self.dtypes = {name: np.dtype(dtype) for name, dtype in footer["columns"]}
+        self._chunks = footer["chunks"]
+        # Row index of the first row of each chunk, plus the total at the end
+        self._chunk_starts = np.cumsum([0] + [chunk["n_rows"] for chunk in self._chunks])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __len__(self):
+        return self.n_rows
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return self.column(key)
+        if isinstance(key, slice):
+            start, stop, step = key.indices(self.n_rows)
+            if step != 1:
+                return {name: values[::step] for name, values in self.read(start, stop).items()}
+            return self.read(start, stop)
+        raise TypeError("Index with a column name or a row slice.")
+
+    @property
+    def columns(self):
+        return tuple(self.dtypes)
+
+    def column(self, name, start=0, stop=None):
+        """
+        Returns rows [start, stop) of a single column as a NumPy array.
+        """
+        if name not in self.dtypes:
+            raise KeyError(f"Unknown result column: {name}")
+        stop = self.n_rows if stop is None else min(stop, self.n_rows)
+        start = max(start, 0)
+        if start >= stop:
+            return np.empty(0, dtype=self.dtypes[name])
+
+        first = np.searchsorted(self._chunk_starts, start, side="right") - 1
+        last = np.searchsorted(self._chunk_starts, stop, side="left")
+        parts = []
+        for i in range(first, last):
+            offset, length = self._chunks[i]["columns"][name]
+            block = np.frombuffer(
+                zlib.decompress(self._mmap[offset:offset + length]), dtype=self.dtypes[name]
+            )
+            chunk_start = self._chunk_starts[i]
+            parts.append(block[max(start - chunk_start, 0):stop - chunk_start])
+        return parts[0] if len(parts) == 1 else np.concatenate(parts)
+
+    def read(self, start=0, stop=None, columns=None):
+        """
+        Returns rows [start, stop) as a dict of column name to NumPy array.
+        """
+        columns = self.columns if columns is None else columns
+        return {name: self.column(name, start, stop) for name in columns}
+
+    def to_frame(self, start=0, stop=None, columns=None):
+        """
+        Returns rows [start, stop) as a DataFrame, with risk_level decoded to a Categorical.
+        """
+        frame = pd.DataFrame(self.read(start, stop, columns))
+        if "risk_level" in frame:
+            frame["risk_level"] = decode_risk_levels(frame["risk_level"])
+        return frame
+
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+if __name__ == "__main__":
+    import tempfile
+
+    from framingham import FraminghamRiskScore, score_batch
+    from patient import Patient
+
+    rng = np.random.default_rng(0)
+    n = 250_000
+    columns = {
+        "age_pts": rng.integers(0, 16, n),
+        "hdl_pts": rng.integers(-2, 3, n),
+        "total_cholesterol_pts": rng.integers(0, 6, n),
+        "bp_pts": rng.integers(-3, 8, n),
+        "smoker_pts": rng.integers(0, 5, n),
+        "score": rng.integers(-5, 34, n),
+        "heart_age": rng.integers(0, 101, n),
+        "ten_yr_risk_percent": rng.random(n) * 100,
+        "risk_level": rng.choice(RISK_LEVELS, n),
+    }
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "cohort.frsr")
+        with ResultWriter(path, chunk_rows=10_000) as writer:
+            writer.append({name: values[:123_456] for name, values in columns.items()})
+            writer.append({name: values[123_456:] for name, values in columns.items()})
+
+        print(f"{n} rows: {os.path.getsize(path)} bytes on disk")
+        with ResultReader(path) as reader:
+            assert len(reader) == n
+            for start, stop in [(0, n), (9_999, 10_001), (123_000, 124_000), (n - 5, n + 5)]:
+                for name, dtype in COLUMNS:
+                    expected = columns[name][start:stop]
+                    if name == "risk_level":
+                        expected = encode_risk_levels(expected)
+                    assert np.array_equal(reader.column(name, start, stop), expected.astype(dtype))
+            frame = reader.to_frame(5, 10)
+            assert list(frame["risk_level"]) == list(columns["risk_level"][5:10])
+        print("All checks passed!")
+        print("")
+
+        pt = Patient(
+            gender="Male",
+            age=39,
+            hdl=1.4,
+            total_cholesterol=4.0,
+            systolic_bp=120,
+        )
+        pt_frs = FraminghamRiskScore(pt)
+        pt_frs.calc_frs()
+        path = os.path.join(tmp, "single.frsr")
+        with ResultWriter(path) as writer:
+            writer.append_frs(pt_frs)
+        with ResultReader(path) as reader:
+            row = reader.to_frame().iloc[0]
+            assert row["age_pts"] == 2
+            assert row["hdl_pts"] == -1
+            assert row["score"] == 1
+            assert row["heart_age"] == 32
+            assert abs(row["ten_yr_risk_percent"] - 1.9) < 1e-6
+            assert row["risk_level"] == "Low"
+        print("All checks passed!")
+        print("")
+
+        path = os.path.join(tmp, "batch.frsr")
+        batch = score_batch([pt, pt], method="equation")
+        with ResultWriter(path) as writer:
+            writer.append(batch)
+        with ResultReader(path) as reader:
+            assert np.array_equal(reader["heart_age"], batch["heart_age"])
+            assert np.allclose(reader["ten_yr_risk_percent"], batch["ten_yr_risk_percent"])
+            assert "score" not in reader.columns
+        print("All checks passed!")
+        print("")
+
+        # A write that fails partway must not leave a readable, truncated file
+        path = os.path.join(tmp, "aborted.frsr")
+        try:
+            with ResultWriter(path, chunk_rows=10_000) as writer:
+                writer.append({name: values[:25_000] for name, values in columns.items()})
+                raise RuntimeError("scoring failed")
+        except RuntimeError:
+            pass
+        assert not os.path.exists(path)
+        print("All checks passed!")
+        print("")
+
+        # Values that do not fit the compact columns are refused, not wrapped
+        for name, bad in [("risk_level", [0, 7]), ("risk_level", [-1, 0]), ("heart_age", [40, 40_000])]:
+            path = os.path.join(tmp, "invalid.frsr")
+            batch = score_batch([pt, pt], method="points")
+            batch[name] = np.array(bad)
+            try:
+                with ResultWriter(path) as writer:
+                    writer.append(batch)
+                raise AssertionError(f"{name}={bad} was written")
+            except ValueError:
+                pass
+            assert not os.path.exists(path)
+        print("All checks passed!")
+        print("")
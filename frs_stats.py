@@ -0,0 +1,354 @@
+import numpy as np
+import pandas as pd
+
+from framingham import RISK_LEVELS
+
+
+# Strata dimensions, in the order they are laid out in the statistics arrays
+STRATA = ("sex", "age_band", "smoker", "hbp_treatment")
+DEFAULT_AGE_BANDS = (40, 50, 60, 70, 80)
+
+# Fixed histogram bins. Heart age uses one bin per year, including the
+# 0 (< 30) and 100 (> 80) sentinels; ten-year risk uses 1% bins.
+HEART_AGE_BINS = 101
+RISK_BINS = 100
+
+# Ten-year risk sentinels from the points method: 0.0 means < 1% and 100.0
+# means > 30%. Rows at either value are counted separately and left out of the
+# risk moments, min / max and histogram, since they are not real percentages.
+RISK_FLOOR = 0.0
+RISK_CEILING = 100.0
+# The true ten-year risk ranges the sentinels stand for, used to bound the mean
+RISK_FLOOR_RANGE = (0.0, 1.0)
+RISK_CEILING_RANGE = (30.0, 100.0)
+
+
+class CohortAggregator:
+    """
+    Online, mergeable summary statistics of scored cohort results.
+
+    Keeps, per sex / age band / smoker / treatment stratum: counts by risk level,
+    counts of saturated ten-year risks (RISK_FLOOR, RISK_CEILING), mean, variance,
+    min and max over the unsaturated risks, and fixed-bin histograms of ten-year
+    risk and heart age. summary() turns the saturated counts into lower and upper
+    bounds on the mean ten-year risk over all rows.
+    Memory use depends only on the number of strata, not on the number of rows.
+
+    Feed it chunk by chunk with update(), e.g. as a sink of framingham.score_stream(),
+    and combine aggregators from other chunks or worker processes with merge().
+    """
+
+    def __init__(self, age_bands=DEFAULT_AGE_BANDS):
+        """
+        Args:
+            age_bands: Increasing ages at which a new age band starts, e.g.
+                (40, 50) gives the bands "<40", "40-49" and "50+".
+        """
+        self.age_bands = tuple(age_bands)
+        if list(self.age_bands) != sorted(set(self.age_bands)):
+            raise ValueError("age_bands must be strictly increasing.")
+        self.age_band_labels = (
+            [f"<{self.age_bands[0]}"]
+            + [f"{low}-{high - 1}" for low, high in zip(self.age_bands, self.age_bands[1:])]
+            + [f"{self.age_bands[-1]}+"]
+        )
+        # (sex, age band, smoker, hbp_treatment)
+        self.shape = (2, len(self.age_band_labels), 2, 2)
+        n_strata = int(np.prod(self.shape))
+
+        self.count = np.zeros(n_strata, dtype=np.int64)
+        self.risk_level_count = np.zeros((n_strata, len(RISK_LEVELS)), dtype=np.int64)
+        self.risk_floor_count = np.zeros(n_strata, dtype=np.int64)
+        self.risk_ceiling_count = np.zeros(n_strata, dtype=np.int64)
+        # Moments below only cover rows with an exact (unsaturated) ten-year risk
+        self.risk_count = np.zeros(n_strata, dtype=np.int64)
+        self.risk_mean = np.zeros(n_strata, dtype=np.float64)
+        # Sum of squared deviations from the mean (Welford / Chan et al.)
+        self.risk_m2 = np.zeros(n_strata, dtype=np.float64)
+        self.risk_min = np.full(n_strata, np.inf)
+        self.risk_max = np.full(n_strata, -np.inf)
+        self.risk_histogram = np.zeros((n_strata, RISK_BINS), dtype=np.int64)
+        self.heart_age_histogram = np.zeros((n_strata, HEART_AGE_BINS), dtype=np.int64)
+
+    def _strata_index(self, columns):
+        age_band = np.zeros(len(columns["age"]), dtype=np.intp)
+        for edge in self.age_bands:
+            age_band += columns["age"] >= edge
+        sex = (~np.asarray(columns["male"], dtype=bool)).astype(np.intp)
+        return np.ravel_multi_index(
+            (
+                sex,
+                age_band,
+                np.asarray(columns["smoker"], dtype=np.intp),
+                np.asarray(columns["hbp_treatment"], dtype=np.intp),
+            ),
+            self.shape,
+        )
+
+    def update(self, columns, results):
+        """
+        Add one chunk of scored rows.
+
+        Args:
+            columns: Cohort columns, as returned by framingham.cohort_columns().
+            results: Matching output of framingham.score_batch().
+        """
+        n_strata = len(self.count)
+        stratum = self._strata_index(columns)
+        risk = np.asarray(results["ten_yr_risk_percent"], dtype=np.float64)
+
+        self.count += np.bincount(stratum, minlength=n_strata)
+        self.risk_level_count += np.bincount(
+            stratum * len(RISK_LEVELS) + results["risk_level"],
+            minlength=n_strata * len(RISK_LEVELS),
+        ).reshape(n_strata, len(RISK_LEVELS))
+        heart_age_bin = np.clip(np.asarray(results["heart_age"], dtype=np.intp), 0, HEART_AGE_BINS - 1)
+        self.heart_age_histogram += np.bincount(
+            stratum * HEART_AGE_BINS + heart_age_bin, minlength=n_strata * HEART_AGE_BINS
+        ).reshape(n_strata, HEART_AGE_BINS)
+
+        floor = risk <= RISK_FLOOR
+        ceiling = risk >= RISK_CEILING
+        self.risk_floor_count += np.bincount(stratum[floor], minlength=n_strata)
+        self.risk_ceiling_count += np.bincount(stratum[ceiling], minlength=n_strata)
+        exact = ~(floor | ceiling)
+        stratum, risk = stratum[exact], risk[exact]
+
+        # Chunk moments per stratum, then merge them into the running ones
+        count = np.bincount(stratum, minlength=n_strata)
+        seen = count > 0
+        mean = np.bincount(stratum, weights=risk, minlength=n_strata)
+        mean[seen] /= count[seen]
+        m2 = np.bincount(stratum, weights=(risk - mean[stratum]) ** 2, minlength=n_strata)
+        self._merge_moments(count, mean, m2)
+
+        np.minimum.at(self.risk_min, stratum, risk)
+        np.maximum.at(self.risk_max, stratum, risk)
+
+        risk_bin = np.clip(risk.astype(np.intp), 0, RISK_BINS - 1)
+        self.risk_histogram += np.bincount(
+            stratum * RISK_BINS + risk_bin, minlength=n_strata * RISK_BINS
+        ).reshape(n_strata, RISK_BINS)
+        return self
+
+    def merge(self, other):
+        """
+        Fold another aggregator with the same age bands into this one.
+        """
+        if other.age_bands != self.age_bands:
+            raise ValueError("Cannot merge aggregators with different age bands.")
+        self.count += other.count
+        self.risk_level_count += other.risk_level_count
+        self.risk_floor_count += other.risk_floor_count
+        self.risk_ceiling_count += other.risk_ceiling_count
+        self._merge_moments(other.risk_count, other.risk_mean, other.risk_m2)
+        np.minimum(self.risk_min, other.risk_min, out=self.risk_min)
+        np.maximum(self.risk_max, other.risk_max, out=self.risk_max)
+        self.risk_histogram += other.risk_histogram
+        self.heart_age_histogram += other.heart_age_histogram
+        return self
+
+    def _merge_moments(self, count, mean, m2):
+        # Chan et al. parallel update; also updates self.risk_count
+        total = self.risk_count + count
+        seen = total > 0
+        delta = mean - self.risk_mean
+        weight = np.zeros_like(self.risk_mean)
+        weight[seen] = count[seen] / total[seen]
+        self.risk_mean += delta * weight
+        self.risk_m2 += m2 + delta**2 * self.risk_count * weight
+        self.risk_count = total
+
+    def _collapse(self, by):
+        """
+        Sum the per-stratum arrays over every strata dimension not in by.
+
+        Returns:
+            Tuple: (index of the kept dimensions, dict of collapsed arrays)
+        """
+        invalid = set(by) - set(STRATA)
+        if invalid:
+            raise ValueError(f"Invalid strata: {sorted(invalid)} Must be in {STRATA}.")
+        axes = tuple(i for i, name in enumerate(STRATA) if name not in by)
+
+        def collapse(values, reduce=np.sum):
+            values = values.reshape(self.shape + values.shape[1:])
+            return reduce(values, axis=axes).reshape((-1,) + values.shape[len(self.shape):])
+
+        risk_count = collapse(self.risk_count)
+        mean = collapse(self.risk_count * self.risk_mean)
+        seen = risk_count > 0
+        mean[seen] /= risk_count[seen]
+        # Between-strata spread has to be added back when merging strata
+        spread = self.risk_count * (self.risk_mean - mean[self._kept_index(axes)]) ** 2
+        collapsed = {
+            "count": collapse(self.count),
+            "risk_level_count": collapse(self.risk_level_count),
+            "risk_floor_count": collapse(self.risk_floor_count),
+            "risk_ceiling_count": collapse(self.risk_ceiling_count),
+            "risk_count": risk_count,
+            "risk_mean": mean,
+            "risk_m2": collapse(self.risk_m2 + spread),
+            "risk_min": collapse(self.risk_min, np.min),
+            "risk_max": collapse(self.risk_max, np.max),
+            "risk_histogram": collapse(self.risk_histogram),
+            "heart_age_histogram": collapse(self.heart_age_histogram),
+        }
+
+        labels = {
+            "sex": ["Male", "Female"],
+            "age_band": self.age_band_labels,
+            "smoker": [False, True],
+            "hbp_treatment": [False, True],
+        }
+        kept = [name for name in STRATA if name in by]
+        if len(kept) > 1:
+            index = pd.MultiIndex.from_product([labels[name] for name in kept], names=kept)
+        elif kept:
+            index = pd.Index(labels[kept[0]], name=kept[0])
+        else:
+            index = pd.Index(["All"], name="stratum")
+        return index, collapsed
+
+    def _kept_index(self, axes):
+        """
+        For every full stratum, the flat index of the collapsed stratum it belongs to.
+        """
+        grid = np.indices(self.shape)
+        kept = [grid[i] for i in range(len(self.shape)) if i not in axes]
+        kept_shape = tuple(size for i, size in enumerate(self.shape) if i not in axes)
+        if not kept:
+            return np.zeros(len(self.count), dtype=np.intp)
+        return np.ravel_multi_index(kept, kept_shape).ravel()
+
+    def summary(self, by=STRATA):
+        """
+        Returns a DataFrame with one row per stratum of the given dimensions:
+        count, counts per risk level, counts of saturated ten-year risks
+        (count_risk_floor: < 1%, count_risk_ceiling: > 30% in points mode), and:
+
+        - mean_ten_yr_risk_lower / mean_ten_yr_risk_upper: bounds on the mean
+          ten-year risk over every row, with floor rows taken as
+          RISK_FLOOR_RANGE and ceiling rows as RISK_CEILING_RANGE.
+        - mean / std / min / max_ten_yr_risk_exact: statistics over only the
+          count_risk_exact rows that are not saturated.
+
+        Pass a subset of STRATA to roll up, e.g. by=("sex",).
+        """
+        index, collapsed = self._collapse(by)
+        count = collapsed["risk_count"]
+        seen = count > 0
+        variance = np.full(len(count), np.nan)
+        variance[count > 1] = collapsed["risk_m2"][count > 1] / (count[count > 1] - 1)
+
+        frame = pd.DataFrame({"count": collapsed["count"]}, index=index)
+        for i, level in enumerate(RISK_LEVELS):
+            frame[f"count_{level.lower()}"] = collapsed["risk_level_count"][:, i]
+        frame["count_risk_floor"] = collapsed["risk_floor_count"]
+        frame["count_risk_ceiling"] = collapsed["risk_ceiling_count"]
+        frame["count_risk_exact"] = count
+
+        total = collapsed["count"].astype(np.float64)
+        total[total == 0] = np.nan
+        exact_sum = count * collapsed["risk_mean"]
+        floor, ceiling = collapsed["risk_floor_count"], collapsed["risk_ceiling_count"]
+        frame["mean_ten_yr_risk_lower"] = (
+            exact_sum + floor * RISK_FLOOR_RANGE[0] + ceiling * RISK_CEILING_RANGE[0]
+        ) / total
+        frame["mean_ten_yr_risk_upper"] = (
+            exact_sum + floor * RISK_FLOOR_RANGE[1] + ceiling * RISK_CEILING_RANGE[1]
+        ) / total
+
+        frame["mean_ten_yr_risk_exact"] = np.where(seen, collapsed["risk_mean"], np.nan)
+        frame["std_ten_yr_risk_exact"] = np.sqrt(variance)
+        frame["min_ten_yr_risk_exact"] = np.where(seen, collapsed["risk_min"], np.nan)
+        frame["max_ten_yr_risk_exact"] = np.where(seen, collapsed["risk_max"], np.nan)
+        return frame
+
+    def histogram(self, name, by=STRATA):
+        """
+        Returns a fixed-bin histogram as a DataFrame, one row per stratum.
+
+        Args:
+            name: "heart_age" (columns are heart ages; 0 means < 30, 100 means > 80)
+                or "ten_yr_risk_percent" (columns are the lower edges of 1% bins;
+                saturated risks are not binned, see count_risk_floor and
+                count_risk_ceiling in summary()).
+            by: Strata dimensions to keep, as in summary().
+        """
+        index, collapsed = self._collapse(by)
+        if name == "heart_age":
+            return pd.DataFrame(collapsed["heart_age_histogram"], index=index, columns=range(HEART_AGE_BINS))
+        if name == "ten_yr_risk_percent":
+            return pd.DataFrame(collapsed["risk_histogram"], index=index, columns=range(RISK_BINS))
+        raise ValueError(f"Invalid histogram: {name} Must be 'heart_age' or 'ten_yr_risk_percent'.")
+
+
+if __name__ == "__main__":
+    import pickle
+
+    from bench_framingham import synthetic_cohort
+    from framingham import score_batch, score_stream, score_to_sinks
+
+    n, chunk_rows = 200_000, 30_000
+    cohort = synthetic_cohort(n)
+    chunks = [
+        {name: values[start:start + chunk_rows] for name, values in cohort.items()}
+        for start in range(0, n, chunk_rows)
+    ]
+
+    # One aggregator per "worker", merged afterwards, must match a single pass
+    workers = [CohortAggregator(), CohortAggregator()]
+    for _ in score_stream(chunks[:3], sinks=[workers[0]]):
+        pass
+    assert score_to_sinks(chunks[3:], sinks=[workers[1]]) == n - 3 * chunk_rows
+    merged = pickle.loads(pickle.dumps(workers[0])).merge(pickle.loads(pickle.dumps(workers[1])))
+
+    results = score_batch(cohort)
+    frame = pd.DataFrame(
+        {
+            "sex": np.where(cohort["male"], "Male", "Female"),
+            "smoker": cohort["smoker"],
+            "risk": results["ten_yr_risk_percent"],
+            "risk_level": results["risk_level"],
+            "heart_age": results["heart_age"],
+        }
+    )
+
+    # Saturated risks are counted, not averaged
+    frame["floor"] = frame["risk"] == RISK_FLOOR
+    frame["ceiling"] = frame["risk"] == RISK_CEILING
+    assert frame["floor"].any() and frame["ceiling"].any()
+    exact = frame[~(frame["floor"] | frame["ceiling"])]
+
+    summary = merged.summary(by=("sex", "smoker"))
+    expected = exact.groupby(["sex", "smoker"])["risk"].agg(["count", "mean", "std", "min", "max"])
+    for key, row in expected.iterrows():
+        group = frame[(frame["sex"] == key[0]) & (frame["smoker"] == key[1])]
+        assert summary.loc[key, "count"] == len(group)
+        assert summary.loc[key, "count_risk_floor"] == group["floor"].sum()
+        assert summary.loc[key, "count_risk_ceiling"] == group["ceiling"].sum()
+        assert summary.loc[key, "count_risk_exact"] == row["count"]
+        assert np.isclose(summary.loc[key, "mean_ten_yr_risk_exact"], row["mean"])
+        assert np.isclose(summary.loc[key, "std_ten_yr_risk_exact"], row["std"])
+        assert summary.loc[key, "min_ten_yr_risk_exact"] == row["min"]
+        assert summary.loc[key, "max_ten_yr_risk_exact"] == row["max"]
+        lower = group["risk"].where(~group["ceiling"], RISK_CEILING_RANGE[0]).mean()
+        upper = group["risk"].where(~group["floor"], RISK_FLOOR_RANGE[1]).mean()
+        assert np.isclose(summary.loc[key, "mean_ten_yr_risk_lower"], lower)
+        assert np.isclose(summary.loc[key, "mean_ten_yr_risk_upper"], upper)
+
+    overall = merged.summary(by=())
+    assert overall["count"].iloc[0] == n
+    assert np.isclose(overall["std_ten_yr_risk_exact"].iloc[0], exact["risk"].std())
+    assert merged.histogram("ten_yr_risk_percent", by=()).to_numpy().sum() == len(exact)
+    for i, level in enumerate(RISK_LEVELS):
+        assert overall[f"count_{level.lower()}"].iloc[0] == (frame["risk_level"] == i).sum()
+
+    heart_ages = merged.histogram("heart_age", by=("sex",))
+    assert np.array_equal(
+        heart_ages.loc["Male"].to_numpy(),
+        np.bincount(frame.loc[frame["sex"] == "Male", "heart_age"], minlength=HEART_AGE_BINS),
+    )
+    print("All checks passed!")
+    print("")
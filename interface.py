@@ -3,7 +3,10 @@ from prediction_model_api_call import predict_single_entry
 import framingham as frs
 from PIL import Image
 import streamlit as st
+import tracing
 import uuid
+
+tracer = tracing.get_tracer()
 favicon = Image.open("img/favicon.png")
 st.set_page_config(page_title="CardiCalc",
                    page_icon=favicon)
@@ -62,39 +65,45 @@ with form_placeholder.form(key="user_form"):
     submitted_now = st.form_submit_button("Submit", disabled=disabled)
 
     if submitted_now and not disabled:
-        st.session_state.submitted = True
-
-        st.session_state.input_age = input_age
-        st.session_state.input_sex = input_sex
-        st.session_state.input_smoker = input_smoker
-        st.session_state.input_hbp = input_hbp
-        st.session_state.input_tot_chol = input_tot_chol
-        st.session_state.input_hdl = input_hdl
-        st.session_state.input_bp = input_bp
-
-        smoker_value = 1 if input_smoker == "Yes" else 0
-        hbp_value = input_hbp == "Yes"
-        gender_value = 1 if input_sex == "Male" else 0
-
-        st.session_state.prediction = predict_single_entry(
-            gender=gender_value,
-            age=input_age,
-            smoking_status=smoker_value,
-            hdl=input_hdl,
-            total_cholesterol=input_tot_chol,
-            systolic_bp=input_bp,
-        )
-
-        st.session_state.pt = Patient(
-            gender=input_sex,
-            age=input_age,
-            hdl=frs.mgdL_to_mmolL(input_hdl),
-            total_cholesterol=frs.mgdL_to_mmolL(input_tot_chol),
-            systolic_bp=input_bp,
-            hbp_treatment=hbp_value,
-            smoker=smoker_value,
-            pt_id=str(uuid.uuid4()),
-        )
+        # pt_id doubles as the trace ID, so every stage of this submission can be found by it
+        pt_id = str(uuid.uuid4())
+        with tracer.span("submission", trace_id=pt_id):
+            with tracer.span("form_handling"):
+                st.session_state.submitted = True
+
+                st.session_state.input_age = input_age
+                st.session_state.input_sex = input_sex
+                st.session_state.input_smoker = input_smoker
+                st.session_state.input_hbp = input_hbp
+                st.session_state.input_tot_chol = input_tot_chol
+                st.session_state.input_hdl = input_hdl
+                st.session_state.input_bp = input_bp
+
+                smoker_value = 1 if input_smoker == "Yes" else 0
+                hbp_value = input_hbp == "Yes"
+                gender_value = 1 if input_sex == "Male" else 0
+
+            with tracer.span("predict_single_entry"):
+                st.session_state.prediction = predict_single_entry(
+                    gender=gender_value,
+                    age=input_age,
+                    smoking_status=smoker_value,
+                    hdl=input_hdl,
+                    total_cholesterol=input_tot_chol,
+                    systolic_bp=input_bp,
+                )
+
+            with tracer.span("patient_construction"):
+                st.session_state.pt = Patient(
+                    gender=input_sex,
+                    age=input_age,
+                    hdl=frs.mgdL_to_mmolL(input_hdl),
+                    total_cholesterol=frs.mgdL_to_mmolL(input_tot_chol),
+                    systolic_bp=input_bp,
+                    hbp_treatment=hbp_value,
+                    smoker=smoker_value,
+                    pt_id=pt_id,
+                )
 
 required_keys = [
     "submitted", "prediction", "pt",
@@ -113,111 +122,116 @@ if all(key in st.session_state for key in required_keys):
     input_hdl = st.session_state.input_hdl
     input_bp = st.session_state.input_bp
 
-    st.header("Your Results")
-    # st.markdown("#### ML Prediction Model")
+    # Runs on every rerun that shows results, traced under the submission's pt_id
+    with tracer.span("render_results", trace_id=pt.pt_id):
+        st.header("Your Results")
+        # st.markdown("#### ML Prediction Model")
 
-    if prediction:
-        risk_color = "B22222"
-        risk_level = "High"
-    else:
-        risk_color = "22b2b2"
-        risk_level = "Low to Medium"
+        if prediction:
+            risk_color = "B22222"
+            risk_level = "High"
+        else:
+            risk_color = "22b2b2"
+            risk_level = "Low to Medium"
 
-    st.markdown(
-        f"<span style='font-size: 32px; color: #{risk_color};'>{risk_level.capitalize()}</span>",
-        unsafe_allow_html=True,
-    )
+        st.markdown(
+            f"<span style='font-size: 32px; color: #{risk_color};'>{risk_level.capitalize()}</span>",
+            unsafe_allow_html=True,
+        )
 
-    pt_frs = frs.FraminghamRiskScore(patient=pt)
-    pt_frs.calc_frs()
-    ten_yr_risk, heart_age, frs_risk_level = pt_frs.interpret_score()
-
-    if ten_yr_risk < 10:
-        risk_color = "008000"
-    elif ten_yr_risk < 20:
-        risk_color = "FF8C00"
-    else:
-        risk_color = "B22222"
-
-    if heart_age == 0:
-        heart_string = "<30"
-        heart_color = "008000"
-    elif heart_age == 100:
-        heart_string = ">80"
-        heart_color = "B22222"
-    else:
-        heart_string = str(heart_age)
-        if heart_age < input_age:
-            heart_color = "008000"
-        elif input_age <= heart_age <= input_age + 5:
-            heart_color = "FF8C00"
+        with tracer.span("frs_scoring"):
+            pt_frs = frs.FraminghamRiskScore(patient=pt)
+            pt_frs.calc_frs()
+            ten_yr_risk, heart_age, frs_risk_level = pt_frs.interpret_score()
+
+        if ten_yr_risk < 10:
+            risk_color = "008000"
+        elif ten_yr_risk < 20:
+            risk_color = "FF8C00"
         else:
-            heart_color = "B22222"
+            risk_color = "B22222"
 
-    if ten_yr_risk == 0.0:
-        riskpercent_string = "<1"
-    elif ten_yr_risk == 100.0:
-        riskpercent_string = ">30"
-    else:
-        riskpercent_string = str(ten_yr_risk)
-
-    st.markdown("#### About Your Results")
-    risk_explanation = {
-        "Low": "You have a **low chance** of developing heart disease in the next 10 years. This means your current health habits are helping. Keep eating well, staying active, and avoiding smoking to maintain your heart health.",
-        "Medium": "You have a **moderate chance** of developing heart disease over the next decade. This suggests that some risk factors may be adding up. Now is a good time to make heart-healthy changes and talk with your doctor about how to reduce your risk",
-        "High": "You have a **high risk** of developing heart disease in the next 10 years. It’s important to take action—this might include lifestyle changes, medications, or other treatments. Talk to your doctor soon to create a plan that supports your heart health.",
-    }
-    if frs_risk_level in risk_explanation:
-        st.markdown(risk_explanation[frs_risk_level])
-    st.markdown("")
-    st.session_state.show_frs = st.toggle("Show Framingham Risk Score", value=st.session_state.show_frs)
-    st.markdown("")
-    if st.session_state.show_frs:
-        st.markdown("#### Framingham Risk Score")
-        col1, col2, col3 = st.columns(3, border=True)
-
-        with col1:
-            st.markdown("#### Heart Age")
+        if heart_age == 0:
+            heart_string = "<30"
+            heart_color = "008000"
+        elif heart_age == 100:
+            heart_string = ">80"
+            heart_color = "B22222"
+        else:
+            heart_string = str(heart_age)
+            if heart_age < input_age:
+                heart_color = "008000"
+            elif input_age <= heart_age <= input_age + 5:
+                heart_color = "FF8C00"
+            else:
+                heart_color = "B22222"
+
+        if ten_yr_risk == 0.0:
+            riskpercent_string = "<1"
+        elif ten_yr_risk == 100.0:
+            riskpercent_string = ">30"
+        else:
+            riskpercent_string = str(ten_yr_risk)
+
+        st.markdown("#### About Your Results")
+        risk_explanation = {
+            "Low": "You have a **low chance** of developing heart disease in the next 10 years. This means your current health habits are helping. Keep eating well, staying active, and avoiding smoking to maintain your heart health.",
+            "Medium": "You have a **moderate chance** of developing heart disease over the next decade. This suggests that some risk factors may be adding up. Now is a good time to make heart-healthy changes and talk with your doctor about how to reduce your risk",
+            "High": "You have a **high risk** of developing heart disease in the next 10 years. It’s important to take action—this might include lifestyle changes, medications, or other treatments. Talk to your doctor soon to create a plan that supports your heart health.",
+        }
+        if frs_risk_level in risk_explanation:
+            st.markdown(risk_explanation[frs_risk_level])
+        st.markdown("")
+        st.session_state.show_frs = st.toggle("Show Framingham Risk Score", value=st.session_state.show_frs)
+        st.markdown("")
+        if st.session_state.show_frs:
+            st.markdown("#### Framingham Risk Score")
+            col1, col2, col3 = st.columns(3, border=True)
+
+            with col1:
+                st.markdown("#### Heart Age")
+                st.markdown(
+                    f"<span style='font-size: 36px; color: #{heart_color};'>{heart_string} years</span>",
+                    unsafe_allow_html=True,
+                )
+
+            with col2:
+                st.markdown("#### Ten-Year Risk")
+                st.markdown(
+                    f"<span style='font-size: 36px; color: #{risk_color};'>{riskpercent_string}%</span>",
+                    unsafe_allow_html=True,
+                )
+
+            with col3:
+                st.markdown("#### Risk Level")
+                st.markdown(
+                    f"<span style='font-size: 36px; color: #{risk_color};'>{frs_risk_level.capitalize()}</span>",
+                    unsafe_allow_html=True,
+                )
+
+            st.markdown("---")
+
+            st.markdown("#### Definitions")
+            st.markdown("##### Heart Age")
             st.markdown(
-                f"<span style='font-size: 36px; color: #{heart_color};'>{heart_string} years</span>",
-                unsafe_allow_html=True,
+                "Heart age estimates the age of your heart and blood vessels based on your risk factors. "
+                "If your heart age is higher than your actual age, it indicates increased risk. "
+                "If it's equal to or lower than your actual age, it suggests better heart health. "
             )
 
-        with col2:
-            st.markdown("#### Ten-Year Risk")
-            st.markdown(
-                f"<span style='font-size: 36px; color: #{risk_color};'>{riskpercent_string}%</span>",
-                unsafe_allow_html=True,
-            )
 
-        with col3:
-            st.markdown("#### Risk Level")
+
+            st.markdown("##### Risk Percent")
             st.markdown(
-                f"<span style='font-size: 36px; color: #{risk_color};'>{frs_risk_level.capitalize()}</span>",
-                unsafe_allow_html=True,
+                "Risk percent is the estimated chance of developing heart disease in the next 10 years. "
+                "For example, a 15% risk means 15 out of 100 people with similar health profiles may develop heart disease over the next decade. "
+                "This is not a guarantee, but just represents real-world data for individuals with similar risk factors. "
+                "Higher percentages reflect higher risk and may require lifestyle or medical intervention. "
             )
 
         st.markdown("---")
 
-        st.markdown("#### Definitions")
-        st.markdown("##### Heart Age")
-        st.markdown(
-            "Heart age estimates the age of your heart and blood vessels based on your risk factors. "
-            "If your heart age is higher than your actual age, it indicates increased risk. "
-            "If it's equal to or lower than your actual age, it suggests better heart health. "
-        )
-
-
-
-        st.markdown("##### Risk Percent")
-        st.markdown(
-            "Risk percent is the estimated chance of developing heart disease in the next 10 years. "
-            "For example, a 15% risk means 15 out of 100 people with similar health profiles may develop heart disease over the next decade. "
-            "This is not a guarantee, but just represents real-world data for individuals with similar risk factors. "
-            "Higher percentages reflect higher risk and may require lifestyle or medical intervention. "
-        )
-
-    st.markdown("---")
+    # Outside the render span: st.rerun() restarts the script by raising
     if st.button("Start Over"):
         for key in list(st.session_state.keys()):
             del st.session_state[key]
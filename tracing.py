@@ -0,0 +1,315 @@
+import contextlib
+import contextvars
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+
+# Environment variables controlling tracing. Tracing is off unless a sample rate is set.
+SAMPLE_RATE_ENV = "FRS_TRACE_SAMPLE_RATE"
+OUTPUT_ENV = "FRS_TRACE_FILE"
+
+SERVICE_NAME = "cardicalc"
+# OTLP enum values
+SPAN_KIND_INTERNAL = 1
+STATUS_CODE_UNSET = 0
+STATUS_CODE_ERROR = 2
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+_tracer = None
+
+
+class Span:
+    """
+    One timed stage of a trace. Create spans with Tracer.span() or Tracer.start_span().
+    """
+
+    def __init__(self, tracer, name, trace_id, parent, sampled, attributes):
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_span_id = parent.span_id if parent is not None else None
+        self.sampled = sampled
+        self.attributes = attributes
+        self.error = None
+
+        self._token = _current_span.set(self)
+        self._start_ns = time.time_ns()
+        self._start_perf_ns = time.perf_counter_ns()
+        self._end_ns = None
+
+    def set_attribute(self, key, value):
+        if self.sampled:
+            self.attributes[key] = value
+
+    def end(self, error=None):
+        """
+        Stop timing, make the parent span current again and export the span if sampled.
+        """
+        if self._end_ns is not None:
+            return
+        self._end_ns = self._start_ns + time.perf_counter_ns() - self._start_perf_ns
+        self.error = error
+        _current_span.reset(self._token)
+        if self.sampled:
+            self.tracer.export(self)
+
+    def to_otlp(self):
+        """
+        Returns the span as an OTLP/JSON Span object (hex IDs, 64-bit integers as strings).
+        """
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_span_id or "",
+            "name": self.name,
+            "kind": SPAN_KIND_INTERNAL,
+            "startTimeUnixNano": str(self._start_ns),
+            "endTimeUnixNano": str(self._end_ns),
+            "attributes": _otlp_attributes(self.attributes),
+            "status": {"code": STATUS_CODE_UNSET},
+        }
+        if self.error is not None:
+            span["status"] = {"code": STATUS_CODE_ERROR, "message": repr(self.error)}
+        return span
+
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_attributes(attributes):
+    return [{"key": key, "value": _otlp_value(value)} for key, value in attributes.items()]
+
+
+class Tracer:
+    """
+    Minimal span tracer. Each finished span is written as one line of OTLP/JSON,
+    a complete ExportTraceServiceRequest (resourceSpans > scopeSpans > spans),
+    the same layout as the OpenTelemetry Collector file exporter. Output goes
+    to stdout or is appended to a file.
+
+    Sampling is decided once per trace ID, so every span of a submission, across
+    Streamlit reruns, is either kept or dropped together.
+    """
+
+    def __init__(self, sample_rate=0.0, output="-"):
+        """
+        Args:
+            sample_rate: Fraction of traces to keep, between 0 and 1.
+            output: "-" for stdout, otherwise the path of a file to append to.
+        """
+        if not 0.0 <= sample_rate <= 1.0:
+            raise ValueError("Please enter a sample rate between 0 and 1.")
+        self.sample_rate = sample_rate
+        self.output = output
+        self._lock = threading.Lock()
+        self._export_failed = False
+
+    @classmethod
+    def from_env(cls):
+        """
+        Configure from the environment. A malformed sample rate disables tracing
+        with a warning rather than breaking the app that imports this module.
+        """
+        output = os.environ.get(OUTPUT_ENV, "-")
+        value = os.environ.get(SAMPLE_RATE_ENV, "0")
+        try:
+            return cls(sample_rate=float(value), output=output)
+        except ValueError:
+            print(
+                f"Tracing disabled: invalid {SAMPLE_RATE_ENV}={value!r}, expected a number between 0 and 1.",
+                file=sys.stderr,
+            )
+            return cls(sample_rate=0.0, output=output)
+
+    def is_sampled(self, trace_id):
+        if self.sample_rate <= 0.0:
+            return False
+        # Trace IDs are random, so their leading bits are a uniform draw
+        return int(trace_id[:16], 16) < self.sample_rate * 2**64
+
+    def start_span(self, name, trace_id=None, **attributes):
+        """
+        Start a span and make it current. It must be finished with Span.end().
+
+        Args:
+            name: Stage name.
+            trace_id: UUID string identifying the trace. Only needed for root spans;
+                child spans inherit the trace of the current span.
+            attributes: Extra key/values recorded on the span.
+        """
+        parent = _current_span.get()
+        if trace_id is not None:
+            trace_id = uuid.UUID(trace_id).hex
+        elif parent is not None:
+            trace_id = parent.trace_id
+        else:
+            trace_id = uuid.uuid4().hex
+        if parent is not None and parent.trace_id != trace_id:
+            parent = None
+
+        sampled = parent.sampled if parent is not None else self.is_sampled(trace_id)
+        return Span(self, name, trace_id, parent, sampled, attributes if sampled else {})
+
+    @contextlib.contextmanager
+    def span(self, name, trace_id=None, **attributes):
+        """
+        Context manager around start_span() / Span.end(). Exceptions are recorded
+        on the span and re-raised. Other BaseExceptions, such as Streamlit's
+        rerun / stop control flow or KeyboardInterrupt, end the span without an
+        error status.
+        """
+        span = self.start_span(name, trace_id, **attributes)
+        try:
+            yield span
+        except Exception as error:
+            span.end(error)
+            raise
+        except BaseException:
+            span.end()
+            raise
+        span.end()
+
+    def export(self, span):
+        request = {
+            "resourceSpans": [
+                {
+                    "resource": {"attributes": _otlp_attributes({"service.name": SERVICE_NAME})},
+                    "scopeSpans": [{"scope": {"name": "tracing"}, "spans": [span.to_otlp()]}],
+                }
+            ]
+        }
+        line = json.dumps(request) + "\n"
+        # Tracing must never break the traced request: on I/O errors the span
+        # is dropped, with a single warning per tracer.
+        with self._lock:
+            try:
+                if self.output == "-":
+                    sys.stdout.write(line)
+                    sys.stdout.flush()
+                else:
+                    with open(self.output, "a") as f:
+                        f.write(line)
+            except OSError as error:
+                if not self._export_failed:
+                    self._export_failed = True
+                    print(f"Tracing: dropping spans, cannot write to {self.output!r}: {error}", file=sys.stderr)
+
+
+def get_tracer():
+    """
+    Returns the process-wide tracer, configured from the environment on first use.
+    """
+    global _tracer
+    if _tracer is None:
+        _tracer = Tracer.from_env()
+    return _tracer
+
+
+if __name__ == "__main__":
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "spans.jsonl")
+        tracer = Tracer(sample_rate=1.0, output=path)
+        pt_id = str(uuid.uuid4())
+
+        with tracer.span("submission", trace_id=pt_id, stage="test"):
+            with tracer.span("predict_single_entry"):
+                time.sleep(0.01)
+            try:
+                with tracer.span("patient_construction"):
+                    raise ValueError("Patient must be at least 30 years old.")
+            except ValueError:
+                pass
+        # A failing stage still exports both itself and its parent, marked as errors
+        try:
+            with tracer.span("render_results", trace_id=pt_id):
+                with tracer.span("frs_scoring"):
+                    raise TypeError("unsupported operand type(s) for +=: 'int' and 'NoneType'")
+        except TypeError:
+            pass
+
+        with open(path) as f:
+            requests = [json.loads(line) for line in f]
+        spans = {}
+        for request in requests:
+            (resource_spans,) = request["resourceSpans"]
+            assert resource_spans["resource"]["attributes"] == [
+                {"key": "service.name", "value": {"stringValue": SERVICE_NAME}}
+            ]
+            for span in resource_spans["scopeSpans"][0]["spans"]:
+                spans[span["name"]] = span
+        assert list(spans) == [
+            "predict_single_entry", "patient_construction", "submission", "frs_scoring", "render_results"
+        ]
+        assert {span["traceId"] for span in spans.values()} == {uuid.UUID(pt_id).hex}
+        root = spans["submission"]
+        assert root["parentSpanId"] == ""
+        assert root["attributes"] == [{"key": "stage", "value": {"stringValue": "test"}}]
+        assert root["kind"] == SPAN_KIND_INTERNAL
+        assert spans["predict_single_entry"]["parentSpanId"] == root["spanId"]
+        assert spans["render_results"]["parentSpanId"] == ""
+        assert spans["frs_scoring"]["parentSpanId"] == spans["render_results"]["spanId"]
+        assert spans["render_results"]["status"]["code"] == STATUS_CODE_ERROR
+        predict = spans["predict_single_entry"]
+        assert int(predict["endTimeUnixNano"]) - int(predict["startTimeUnixNano"]) >= 10_000_000
+        assert spans["patient_construction"]["status"]["code"] == STATUS_CODE_ERROR
+        assert root["status"]["code"] == STATUS_CODE_UNSET
+        assert _current_span.get() is None
+        print("All checks passed!")
+        print("")
+
+        # Sampling is all-or-nothing per trace
+        tracer = Tracer(sample_rate=0.5, output=path)
+        kept = 0
+        for _ in range(2000):
+            with tracer.span("submission", trace_id=str(uuid.uuid4())) as root:
+                with tracer.span("child") as child:
+                    assert child.sampled == root.sampled
+            kept += root.sampled
+        assert 800 < kept < 1200
+        assert not Tracer(sample_rate=0.0).is_sampled(uuid.uuid4().hex)
+        print("All checks passed!")
+        print("")
+
+        # Export failures and control-flow exceptions never surface as errors
+        tracer = Tracer(sample_rate=1.0, output=os.path.join(tmp, "missing", "spans.jsonl"))
+        with tracer.span("submission", trace_id=str(uuid.uuid4())):
+            pass
+        try:
+            with tracer.span("submission", trace_id=str(uuid.uuid4())):
+                raise ValueError("Please enter a valid HDL-C level.")
+        except ValueError:
+            pass
+        assert tracer._export_failed
+
+        class RerunException(BaseException):
+            pass
+
+        tracer = Tracer(sample_rate=1.0, output=path)
+        try:
+            with tracer.span("render_results", trace_id=str(uuid.uuid4())) as render:
+                raise RerunException()
+        except RerunException:
+            pass
+        assert render.error is None
+        assert render.to_otlp()["status"]["code"] == STATUS_CODE_UNSET
+
+        os.environ[SAMPLE_RATE_ENV] = "ten percent"
+        assert Tracer.from_env().sample_rate == 0.0
+        os.environ[SAMPLE_RATE_ENV] = "2"
+        assert Tracer.from_env().sample_rate == 0.0
+        del os.environ[SAMPLE_RATE_ENV]
+        print("All checks passed!")
+        print("")